@@ -1,8 +1,100 @@
 import secrets
 import time
+import numpy as np
 import psutil
+
+try:
+    from _kernels import des_ecb_u64
+except ImportError:  # numba is not installed, the numpy and pure Python paths are used
+    des_ecb_u64 = None
 # Generate 8 random bytes (64 bits)
 
+
+# Builds the steps of a bit permutation over integers. Output bits that move by the
+# same distance are grouped under one mask, so a permutation is a few shift-AND-OR ops.
+def _build_permutation(table, in_bits):
+    out_bits = len(table)
+    groups = {}
+    for j, src in enumerate(table):
+        src_pos = in_bits - src
+        shift = (out_bits - 1 - j) - src_pos
+        groups[shift] = groups.get(shift, 0) | (1 << src_pos)
+    return tuple((mask, max(shift, 0), max(-shift, 0)) for shift, mask in sorted(groups.items()))
+
+
+def _apply_permutation(x, steps):
+    out = 0
+    for mask, left, right in steps:
+        out |= ((x & mask) << left) >> right
+    return out
+
+
+# Builds the byte translation tables of a permutation. Entry [b][v] holds the output bits
+# given by byte b of the input (most significant first) when it has the value v, so a
+# permutation is one table lookup per input byte ORed together.
+def _build_byte_tables(steps, in_bits):
+    tables = []
+    for b in range(in_bits // 8):
+        shift = in_bits - 8 * (b + 1)
+        tables.append(tuple(_apply_permutation(v << shift, steps) for v in range(256)))
+    return tuple(tables)
+
+
+# Builds the 8 SP-boxes: for every 6 bits input of an S-box, its 4 bits output already
+# placed in the 32 bits word and passed through the P permutation.
+def _build_sp_boxes(sbox, p_steps):
+    sp = []
+    for i in range(8):
+        table = []
+        for chunk in range(64):
+            r = ((chunk >> 4) & 0b10) | (chunk & 1)
+            c = (chunk >> 1) & 0xF
+            table.append(_apply_permutation(sbox[i][r][c] << (28 - 4*i), p_steps))
+        sp.append(tuple(table))
+    return tuple(sp)
+
+
+# Generates DES on one block with the 16 rounds unrolled: no loop, no swap of L and R and no
+# enc branch. The same function decrypts when it is given the subkeys in reverse order.
+def _build_unrolled_des_block(ip, ip_inv, e, sp):
+    lines = ["def des_block(block, subkeys):",
+             "    " + ", ".join(f"K{r}" for r in range(16)) + " = subkeys",
+             "    x = " + " | ".join(f"IP{b}[(block >> {56 - 8*b}) & 0xFF]" for b in range(8)),
+             "    L, R = x >> 32, x & 0xFFFFFFFF"]
+    for r in range(16):
+        src, dst = ("R", "L") if r % 2 == 0 else ("L", "R")
+        lines.append(f"    x = (E0[{src} >> 24] | E1[({src} >> 16) & 0xFF] | E2[({src} >> 8) & 0xFF] | "
+                     f"E3[{src} & 0xFF]) ^ K{r}")
+        lines.append(f"    {dst} ^= (SP0[x >> 42] ^ SP1[(x >> 36) & 0x3F] ^ SP2[(x >> 30) & 0x3F] ^ "
+                     f"SP3[(x >> 24) & 0x3F] ^ SP4[(x >> 18) & 0x3F] ^ SP5[(x >> 12) & 0x3F] ^ "
+                     f"SP6[(x >> 6) & 0x3F] ^ SP7[x & 0x3F])")
+    lines.append("    x = (R << 32) | L")
+    lines.append("    return " + " | ".join(f"FP{b}[(x >> {56 - 8*b}) & 0xFF]" for b in range(8)))
+
+    namespace = {}
+    for name, tables in (("IP", ip), ("FP", ip_inv), ("E", e), ("SP", sp)):
+        for i, table in enumerate(tables):
+            namespace[f"{name}{i}"] = table
+    exec("\n".join(lines), namespace)
+    return namespace["des_block"]
+
+
+# Builds the gather index of the bitsliced S-boxes. Row j lists the 32 minterms (S-box
+# number * 64 + 6 bits input) whose output bit lands on bit j after the P permutation.
+def _build_sp_gather(sbox, p):
+    gather = []
+    for src in p:
+        i, k = (src - 1) // 4, (src - 1) % 4
+        row = []
+        for chunk in range(64):
+            r = ((chunk >> 4) & 0b10) | (chunk & 1)
+            c = (chunk >> 1) & 0xF
+            if (sbox[i][r][c] >> (3 - k)) & 1:
+                row.append(i*64 + chunk)
+        gather.append(row)
+    return np.array(gather, dtype=np.intp)
+
+
 class DES:
     # Predefine Initial Permutation with the inverse
     IP = [58, 50, 42, 34, 26, 18, 10, 2, 60, 52, 44, 36, 28, 20, 12, 4,
@@ -85,113 +177,185 @@ class DES:
          [2, 1, 14, 7, 4, 10, 8, 13, 15, 12, 9, 0, 3, 5, 6, 11]]
     ]
 
-    # Bit equations for permutations and XOR
-    @staticmethod
-    def perm(bits, table):
-        return [bits[i - 1] for i in table]
-
-    @staticmethod
-    def xor(a, b):
-        return [i ^ j for i, j in zip(a, b)]
-
+    # Precomputed shift/mask steps for each permutation table
+    IP_STEPS = _build_permutation(IP, 64)
+    IP_INV_STEPS = _build_permutation(IP_INV, 64)
+    E_STEPS = _build_permutation(E, 32)
+    P_STEPS = _build_permutation(P, 32)
+    PC1_STEPS = _build_permutation(PC1, 64)
+    PC2_STEPS = _build_permutation(PC2, 56)
+
+    # Byte translation tables of each permutation
+    IP_XLAT = _build_byte_tables(IP_STEPS, 64)
+    IP_INV_XLAT = _build_byte_tables(IP_INV_STEPS, 64)
+    E_XLAT = _build_byte_tables(E_STEPS, 32)
+    PC1_XLAT = _build_byte_tables(PC1_STEPS, 64)
+    PC2_XLAT = _build_byte_tables(PC2_STEPS, 56)
+
+    # S-boxes fused with the P permutation
+    SP = _build_sp_boxes(SBOX, P_STEPS)
+
+    # Tables as numpy arrays for the numba kernel
+    SP_TABLE = np.array(SP, dtype=np.uint32)
+    IP_TABLE = np.array(IP_XLAT, dtype=np.uint64)
+    IP_INV_TABLE = np.array(IP_INV_XLAT, dtype=np.uint64)
+    E_TABLE = np.array(E_XLAT, dtype=np.uint64)
+
+    # Bit indexes used by the bitsliced version, where each bit of the block is an array
+    BS_IP = np.array(IP) - 1
+    BS_IP_INV = np.array(IP_INV) - 1
+    BS_E = np.array(E) - 1
+    BS_SP_GATHER = _build_sp_gather(SBOX, P)
+    BS_KEY_BITS = np.arange(47, -1, -1, dtype=np.uint64)
+
+    # Below this number of blocks the bitsliced version is slower than the unrolled des_block
+    BITSLICE_MIN_BLOCKS = 32
+
+    # Unrolled des_block. Decryption is the same function (an alias) called with the reversed subkeys
+    des_block_encrypt = staticmethod(_build_unrolled_des_block(IP_XLAT, IP_INV_XLAT, E_XLAT, SP))
+    des_block_decrypt = des_block_encrypt
+
+    # Bit equations for permutations, on blocks packed into integers
     @staticmethod
-    def shift_left(bits, n):
-        return bits[n:] + bits[:n]
+    def perm(x, xlat):
+        out = 0
+        shift = 8 * len(xlat)
+        for table in xlat:
+            shift -= 8
+            out |= table[(x >> shift) & 0xFF]
+        return out
 
-    # Removes the parity bits and shifts to the left C and D.
-    # Returns the 16 keys
+    # Removes the parity bits and rotates to the left C and D (28 bits integers).
+    # key64 is the 8 bytes key. Returns the 16 keys as 48 bits integers
     def gen_subkeys(self, key64):
-        key56 = self.perm(key64, self.PC1)
-        C, D = key56[:28], key56[28:]
+        # A list (like the old 64 bits key format) would silently give a wrong key
+        if not isinstance(key64, (bytes, bytearray, memoryview)):
+            raise TypeError(f"DES key must be 8 bytes, not {type(key64).__name__}")
+        if len(key64) != 8:
+            raise ValueError(f"DES key must be exactly 8 bytes (64 bits), got {len(key64)}")
+        key56 = self.perm(int.from_bytes(key64, 'big'), self.PC1_XLAT)
+        C, D = key56 >> 28, key56 & 0x0FFFFFFF
+        perm, pc2 = self.perm, self.PC2_XLAT
         subkeys = []
 
         for s in self.SHIFTS:
-            C = self.shift_left(C, s)
-            D = self.shift_left(D, s)
-            subkeys.append(self.perm(C + D, self.PC2))
+            C = ((C << s) | (C >> (28 - s))) & 0x0FFFFFFF
+            D = ((D << s) | (D >> (28 - s))) & 0x0FFFFFFF
+            subkeys.append(perm((C << 28) | D, pc2))
 
         return subkeys
 
-    #Does the substitution of the SBLOCKS
-    def sbox_sub(self, block48):
-        out = []
-        for i in range(8):
-            chunk = block48[i*6:(i+1)*6]
-            r = (chunk[0] << 1) | chunk[5]
-            c = (chunk[1] << 3) | (chunk[2] << 2) | (chunk[3] << 1) | chunk[4]
-            val = self.SBOX[i][r][c]
-            out.extend([(val >> 3) & 1, (val >> 2) & 1, (val >> 1) & 1, val & 1])
-        return out
-
-    #Does the permutation after the SBOX substitution
-    def feistel(self, R, K):
-        expanded = self.perm(R, self.E)
-        tmp = self.xor(expanded, K)
-        return self.perm(self.sbox_sub(tmp), self.P)
-
-    # The start of each round, dividing the word in two fixed 32 bits blocks.
-    def des_block(self, block64, subkeys, enc=True):
-        block = self.perm(block64, self.IP)
-        L, R = block[:32], block[32:]
-        order = subkeys if enc else subkeys[::-1]
-
-        for K in order:
-            L, R = R, self.xor(L, self.feistel(R, K))
-
-        return self.perm(R + L, self.IP_INV)
-
-    #Changes the string to bits. Used when typing the word you want to check.
-    @staticmethod
-    def string_to_bits(s):
-        bits = []
-        for ch in s:
-            v = ord(ch)
-            bits.extend([(v >> i) & 1 for i in range(7, -1, -1)])
-        return bits
-
-    # Changes the bits to string. Useful to show the results.
+    # The subkeys in the order of the rounds for each direction (reversed for decryption), as
+    # lists for the Python versions and as uint64 arrays for the numba kernel. Built once per key
+    def key_schedule(self, key64):
+        subkeys = self.gen_subkeys(key64)
+        return {
+            'encrypt': subkeys,
+            'decrypt': subkeys[::-1],
+            'encrypt_u64': np.array(subkeys, dtype=np.uint64),
+            'decrypt_u64': np.array(subkeys[::-1], dtype=np.uint64),
+        }
+
+    # Bitsliced DES over many blocks at once. The blocks are transposed so that row j holds
+    # bit j of every block, 64 blocks per uint64 word. Permutations become row indexing and
+    # the S-boxes are evaluated as boolean logic (minterms ORed together) on whole rows.
+    # subkeys are already in the order of the rounds (reversed for decryption).
+    def des_blocks_bitslice(self, blocks, subkeys):
+        n = len(blocks)
+        padded = np.zeros(-(-n // 64) * 64, dtype='>u8')
+        padded[:n] = blocks
+        bits = np.unpackbits(padded.view(np.uint8).reshape(-1, 8), axis=1)
+        state = np.ascontiguousarray(np.packbits(bits.T, axis=1)).view(np.uint64)
+
+        state = state[self.BS_IP]
+        L, R = state[:32], state[32:]
+        ones = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+        for K in subkeys:
+            key_rows = ((np.uint64(K) >> self.BS_KEY_BITS) & np.uint64(1)) * ones
+            x = (R[self.BS_E] ^ key_rows[:, None]).reshape(8, 6, -1)
+            hi, lo = x[:, 0::2], x[:, 1::2]
+            n_hi, n_lo = ~hi, ~lo
+            dec = np.stack([n_hi & n_lo, n_hi & lo, hi & n_lo, hi & lo], axis=2)
+            minterms = (dec[:, 0, :, None, None] & dec[:, 1, None, :, None] & dec[:, 2, None, None, :])
+            minterms = minterms.reshape(512, -1)
+            f = np.bitwise_or.reduce(minterms[self.BS_SP_GATHER], axis=1)
+            L, R = R, L ^ f
+
+        state = np.concatenate([R, L])[self.BS_IP_INV]
+        bits = np.unpackbits(np.ascontiguousarray(state).view(np.uint8), axis=1)
+        out = np.ascontiguousarray(np.packbits(bits.T, axis=1)).view('>u8').ravel()
+        return out[:n].astype(np.uint64)
+
+    # Changes the packed bits (bytes) to string. Useful to show the results.
     @staticmethod
     def bits_to_string(b):
-        out = ""
-        for i in range(0, len(b), 8):
-            byte = b[i:i+8]
-            v = 0
-            for bit in byte:
-                v = (v << 1) | bit
-            out += chr(v)
-        return out
+        return bytes(b).decode('latin-1')
 
-    #For words that not have a length divisible of 8, a pad of bits is added
-    def pad(self, bits):
-        pad_len = 8 - ((len(bits)//8) % 8)
-        bits += self.string_to_bits(chr(pad_len)) * pad_len
-        return bits
+    #For words that not have a length divisible of 8, a pad of bytes is added (PKCS#5)
+    def pad(self, data):
+        pad_len = 8 - (len(data) % 8)
+        return data + bytes([pad_len]) * pad_len
 
     # Remove the padding for the decryption
-    def unpad(self, bits):
-        pad_byte = bits[-8:]
-        pad_len = ord(self.bits_to_string(pad_byte))
-        return bits[:-(pad_len * 8)]
+    def unpad(self, data):
+        return data[:-data[-1]]
+
+    # Runs DES on every 64 bits block of data, with the subkeys of key_schedule. Uses the numba
+    # kernel when available, otherwise bitsliced when there are enough blocks, otherwise one
+    # block at a time
+    def des_blocks(self, data, schedule, enc=True):
+        direction = 'encrypt' if enc else 'decrypt'
+        if des_ecb_u64 is not None:
+            blocks = np.frombuffer(data, dtype='>u8').astype(np.uint64)
+            out = des_ecb_u64(blocks, schedule[direction + '_u64'], self.SP_TABLE,
+                              self.IP_TABLE, self.IP_INV_TABLE, self.E_TABLE)
+            return out.astype('>u8').tobytes()
+        if len(data) >= 8 * self.BITSLICE_MIN_BLOCKS:
+            blocks = np.frombuffer(data, dtype='>u8').astype(np.uint64)
+            return self.des_blocks_bitslice(blocks, schedule[direction]).astype('>u8').tobytes()
+        des_block = self.des_block_encrypt if enc else self.des_block_decrypt
+        keys = schedule[direction]
+        return b''.join(des_block(int.from_bytes(data[i:i+8], 'big'), keys).to_bytes(8, 'big')
+                        for i in range(0, len(data), 8))
 
     # ------------------- Functions for decrypting and encrypting the words-------------------
-    def encrypt(self, text, key64):
-        subkeys = self.gen_subkeys(key64)
-        bits = self.pad(self.string_to_bits(text))
+    # schedule can be given when it was already built for key64 (see key_schedule)
+    def encrypt(self, text, key64, schedule=None):
+        if schedule is None:
+            schedule = self.key_schedule(key64)
+        data = self.pad(text.encode('latin-1'))
+        return self.des_blocks(data, schedule, enc=True)  # returns the ciphertext bytes
+
+    def decrypt(self, ciphertext, key64, schedule=None):
+        if schedule is None:
+            schedule = self.key_schedule(key64)
+        data = self.des_blocks(ciphertext, schedule, enc=False)
+        return self.unpad(data).decode('latin-1')
+
+    # Same as encrypt on each text, with one run of DES over the blocks of all of them
+    def encrypt_many(self, texts, key64, schedule=None):
+        if schedule is None:
+            schedule = self.key_schedule(key64)
+        padded = [self.pad(text.encode('latin-1')) for text in texts]
+        data = self.des_blocks(b''.join(padded), schedule, enc=True)
         out = []
+        offset = 0
+        for block in padded:
+            out.append(data[offset:offset + len(block)])
+            offset += len(block)
+        return out
 
-        for i in range(0, len(bits), 64):
-            out += self.des_block(bits[i:i+64], subkeys, enc=True)
-
-        return out  # returns bit array
-
-    def decrypt(self, bitstream, key64):
-        subkeys = self.gen_subkeys(key64)
+    def decrypt_many(self, ciphertexts, key64, schedule=None):
+        if schedule is None:
+            schedule = self.key_schedule(key64)
+        data = self.des_blocks(b''.join(ciphertexts), schedule, enc=False)
         out = []
-
-        for i in range(0, len(bitstream), 64):
-            out += self.des_block(bitstream[i:i+64], subkeys, enc=False)
-
-        return self.bits_to_string(self.unpad(out))
+        offset = 0
+        for ciphertext in ciphertexts:
+            out.append(self.unpad(data[offset:offset + len(ciphertext)]).decode('latin-1'))
+            offset += len(ciphertext)
+        return out
 
 
 
@@ -225,31 +389,36 @@ def measure_des_decrypt(des_obj, ciphertext, key, repeats=1000):
 
     return avg_time, cpu_usage
 
-des = DES()
-key = [secrets.randbelow(2) for _ in range(64)]
-
-print(measure_des_encrypt(des, "HOPE", key))
-cipher = des.encrypt("HOPE", key)
-print("Cipher:", cipher)
-print("Cipher text:", des.bits_to_string(cipher))
-print(measure_des_decrypt(des, cipher, key))
-plain = des.decrypt(cipher, key)
-print("Decrypted:", plain)
-print("\n")
-
-print(measure_des_encrypt(des, "HELLO", key))
-cipher = des.encrypt("HELLO", key)
-print("Cipher:", cipher)
-print("Cipher text:", des.bits_to_string(cipher))
-print(measure_des_decrypt(des, cipher, key))
-plain = des.decrypt(cipher, key)
-print("Decrypted:", plain)
-print("\n")
-
-print(measure_des_encrypt(des, "NEW YEAR", key))
-cipher = des.encrypt("NEW YEAR", key)
-print("Cipher:", cipher)
-print("Cipher text:", des.bits_to_string(cipher))
-print(measure_des_decrypt(des, cipher, key))
-plain = des.decrypt(cipher, key)
-print("Decrypted:", plain)
+def main():
+    des = DES()
+    key = secrets.token_bytes(8)
+
+    print(measure_des_encrypt(des, "HOPE", key))
+    cipher = des.encrypt("HOPE", key)
+    print("Cipher:", cipher)
+    print("Cipher text:", des.bits_to_string(cipher))
+    print(measure_des_decrypt(des, cipher, key))
+    plain = des.decrypt(cipher, key)
+    print("Decrypted:", plain)
+    print("\n")
+
+    print(measure_des_encrypt(des, "HELLO", key))
+    cipher = des.encrypt("HELLO", key)
+    print("Cipher:", cipher)
+    print("Cipher text:", des.bits_to_string(cipher))
+    print(measure_des_decrypt(des, cipher, key))
+    plain = des.decrypt(cipher, key)
+    print("Decrypted:", plain)
+    print("\n")
+
+    print(measure_des_encrypt(des, "NEW YEAR", key))
+    cipher = des.encrypt("NEW YEAR", key)
+    print("Cipher:", cipher)
+    print("Cipher text:", des.bits_to_string(cipher))
+    print(measure_des_decrypt(des, cipher, key))
+    plain = des.decrypt(cipher, key)
+    print("Decrypted:", plain)
+
+
+if __name__ == "__main__":
+    main()
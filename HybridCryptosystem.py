@@ -3,7 +3,6 @@ import sys
 import os
 import time
 import psutil
-import threading
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
@@ -11,67 +10,52 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from Rotor import RotorMachine
 
 # Import DES class
-import importlib.util
-spec = importlib.util.spec_from_file_location("des_module", "Des.py")
-des_module = importlib.util.module_from_spec(spec)
-import io
-old_stdout = sys.stdout
-sys.stdout = io.StringIO()
-try:
-    spec.loader.exec_module(des_module)
-finally:
-    sys.stdout = old_stdout
-
-DES = des_module.DES
+from Des import DES
 
 
 class PerformanceAnalyzer:
     """
     Analyzes performance metrics for the hybrid cryptosystem.
+    
+    Resources are sampled once before and once after the measured code, so
+    nothing runs next to it and skews the numbers.
     """
     
     def __init__(self):
         self.start_time = 0
         self.end_time = 0
-        self.cpu_percent_samples = []
-        self.memory_percent_samples = []
-        self.monitoring = False
+        self.start_cpu_time = 0
+        self.end_cpu_time = 0
+        self.start_rss = 0
+        self.end_rss = 0
+        self.process = psutil.Process()
+        self.total_memory = psutil.virtual_memory().total
         
     def start_monitoring(self):
         """Start performance monitoring."""
+        self.start_rss = self.process.memory_info().rss
+        # Wall time read outside the CPU time, so the CPU window lies inside the wall window
         self.start_time = time.perf_counter()
-        self.cpu_percent_samples = []
-        self.memory_percent_samples = []
-        self.monitoring = True
-        
-        # Start resource monitoring in background
-        def monitor_resources():
-            while self.monitoring:
-                self.cpu_percent_samples.append(psutil.cpu_percent(interval=0.01))
-                self.memory_percent_samples.append(psutil.virtual_memory().percent)
-                time.sleep(0.01)
-        
-        self.monitor_thread = threading.Thread(target=monitor_resources, daemon=True)
-        self.monitor_thread.start()
+        self.start_cpu_time = time.process_time()
     
     def stop_monitoring(self):
         """Stop performance monitoring."""
+        self.end_cpu_time = time.process_time()
         self.end_time = time.perf_counter()
-        self.monitoring = False
-        if hasattr(self, 'monitor_thread'):
-            self.monitor_thread.join(timeout=0.1)
+        self.end_rss = self.process.memory_info().rss
     
     def get_computation_time(self):
         """Get computation time in milliseconds."""
         return (self.end_time - self.start_time) * 1000
     
     def get_average_cpu_usage(self):
-        """Get average CPU usage percentage."""
-        return sum(self.cpu_percent_samples) / len(self.cpu_percent_samples) if self.cpu_percent_samples else 0
+        """Get CPU usage percentage (process CPU time over wall time)."""
+        wall_time = self.end_time - self.start_time
+        return 100 * (self.end_cpu_time - self.start_cpu_time) / wall_time if wall_time > 0 else 0
     
     def get_average_memory_usage(self):
-        """Get average memory usage percentage."""
-        return sum(self.memory_percent_samples) / len(self.memory_percent_samples) if self.memory_percent_samples else 0
+        """Get average memory usage percentage of the process."""
+        return 100 * (self.start_rss + self.end_rss) / 2 / self.total_memory
     
     def analyze_complexity(self, message_length):
         """
@@ -119,7 +103,7 @@ class HybridCryptosystem:
             rotor1_pos: Initial position for rotor 1
             rotor2_pos: Initial position for rotor 2
             rotor3_pos: Initial position for rotor 3
-            des_key: 64-bit key for DES (list of bits)
+            des_key: 64-bit key for DES (8 bytes)
         """
         # Default rotor configurations if not provided
         if rotor1_wiring is None:
@@ -144,51 +128,145 @@ class HybridCryptosystem:
         
         # Generate or use provided DES key
         if des_key is None:
-            self.des_key = [secrets.randbelow(2) for _ in range(64)]
+            self.des_key = secrets.token_bytes(8)
         else:
             self.des_key = des_key
+        
+        # The 16 DES subkeys only depend on the key, so they are generated once, in both
+        # orders and as lists and uint64 arrays (see DES.key_schedule)
+        self._key_schedule = self.des.key_schedule(self.des_key)
     
     def reset_rotors(self):
         """Reset the rotor machine to initial positions."""
         self.rotor_machine.reset(*self.initial_rotor_positions)
     
-    def encrypt(self, plaintext):
+    def encrypt(self, plaintext, trace=None):
         """
         Encrypt plaintext using Rotor Machine first, then DES.
         
         Args:
             plaintext: String to encrypt
+            trace: Optional dict that receives the intermediate results ('E1' for
+                   the Rotor output, 'E2' for the DES output) and the time of each
+                   stage in ns ('E1_ns', 'E2_ns')
         
         Returns:
-            Encrypted bit array (DES output format)
+            Encrypted bytes (DES output format)
         """
+        start = time.perf_counter_ns()
+        
         # Reset rotors to initial position
         self.reset_rotors()
         
         # Encrypt with Rotor Machine
         rotor_encrypted = self.rotor_machine.encrypt(plaintext)
+        rotor_done = time.perf_counter_ns()
         
         # Encrypt the rotor output with DES
-        des_encrypted = self.des.encrypt(rotor_encrypted, self.des_key)
+        des_encrypted = self.des.encrypt(rotor_encrypted, self.des_key, self._key_schedule)
+        des_done = time.perf_counter_ns()
+        
+        if trace is not None:
+            trace['E1'] = rotor_encrypted
+            trace['E2'] = des_encrypted
+            trace['E1_ns'] = rotor_done - start
+            trace['E2_ns'] = des_done - rotor_done
         
         return des_encrypted
     
-    def decrypt(self, ciphertext_bits):
+    def decrypt(self, ciphertext, trace=None):
         """
         Decrypt ciphertext using DES first, then Rotor Machine.
         
         Args:
-            ciphertext_bits: Encrypted bit array (from DES)
+            ciphertext: Encrypted bytes (from DES)
+            trace: Optional dict that receives the intermediate results ('D1' for
+                   the DES output, 'D2' for the Rotor output) and the time of each
+                   stage in ns ('D1_ns', 'D2_ns')
         
         Returns:
             Decrypted plaintext string
         """
+        start = time.perf_counter_ns()
+        
         # Decrypt with DES
-        des_decrypted = self.des.decrypt(ciphertext_bits, self.des_key)
+        des_decrypted = self.des.decrypt(ciphertext, self.des_key, self._key_schedule)
+        des_done = time.perf_counter_ns()
         
         # Reset rotors and decrypt with Rotor Machine
         self.reset_rotors()
         rotor_decrypted = self.rotor_machine.encrypt(des_decrypted)
+        rotor_done = time.perf_counter_ns()
+        
+        if trace is not None:
+            trace['D1'] = des_decrypted
+            trace['D2'] = rotor_decrypted
+            trace['D1_ns'] = des_done - start
+            trace['D2_ns'] = rotor_done - des_done
+        
+        return rotor_decrypted
+    
+    def encrypt_batch(self, plaintexts, trace=None):
+        """
+        Encrypt several plaintexts, each one as encrypt would, running DES once
+        over the blocks of all of them.
+        
+        Args:
+            plaintexts: List of strings to encrypt
+            trace: Optional dict that receives the intermediate results ('E1' and
+                   'E2' lists) and the time of each stage in ns ('E1_ns', 'E2_ns')
+        
+        Returns:
+            List of encrypted bytes
+        """
+        start = time.perf_counter_ns()
+        
+        # Encrypt with Rotor Machine, from the initial position for every message
+        self.reset_rotors()
+        rotor_encrypted = self.rotor_machine.encrypt_many(plaintexts)
+        rotor_done = time.perf_counter_ns()
+        
+        # Encrypt all the rotor outputs with DES
+        des_encrypted = self.des.encrypt_many(rotor_encrypted, self.des_key, self._key_schedule)
+        des_done = time.perf_counter_ns()
+        
+        if trace is not None:
+            trace['E1'] = rotor_encrypted
+            trace['E2'] = des_encrypted
+            trace['E1_ns'] = rotor_done - start
+            trace['E2_ns'] = des_done - rotor_done
+        
+        return des_encrypted
+    
+    def decrypt_batch(self, ciphertexts, trace=None):
+        """
+        Decrypt several ciphertexts, each one as decrypt would, running DES once
+        over the blocks of all of them.
+        
+        Args:
+            ciphertexts: List of encrypted bytes (from DES)
+            trace: Optional dict that receives the intermediate results ('D1' and
+                   'D2' lists) and the time of each stage in ns ('D1_ns', 'D2_ns')
+        
+        Returns:
+            List of decrypted plaintext strings
+        """
+        start = time.perf_counter_ns()
+        
+        # Decrypt all the messages with DES
+        des_decrypted = self.des.decrypt_many(ciphertexts, self.des_key, self._key_schedule)
+        des_done = time.perf_counter_ns()
+        
+        # Decrypt with Rotor Machine, from the initial position for every message
+        self.reset_rotors()
+        rotor_decrypted = self.rotor_machine.encrypt_many(des_decrypted)
+        rotor_done = time.perf_counter_ns()
+        
+        if trace is not None:
+            trace['D1'] = des_decrypted
+            trace['D2'] = rotor_decrypted
+            trace['D1_ns'] = des_done - start
+            trace['D2_ns'] = rotor_done - des_done
         
         return rotor_decrypted
     
@@ -200,11 +278,11 @@ class HybridCryptosystem:
             plaintext: String to encrypt
         
         Returns:
-            Tuple of (encrypted_bits, encrypted_string_representation)
+            Tuple of (encrypted_bytes, encrypted_string_representation)
         """
-        encrypted_bits = self.encrypt(plaintext)
-        encrypted_string = self.des.bits_to_string(encrypted_bits)
-        return encrypted_bits, encrypted_string
+        encrypted_bytes = self.encrypt(plaintext)
+        encrypted_string = self.des.bits_to_string(encrypted_bytes)
+        return encrypted_bytes, encrypted_string
     
     def get_des_key_hex(self):
         """
@@ -213,15 +291,7 @@ class HybridCryptosystem:
         Returns:
             Hexadecimal representation of the DES key
         """
-        # Convert bit array to hex string
-        hex_str = ""
-        for i in range(0, len(self.des_key), 4):
-            nibble = self.des_key[i:i+4]
-            val = 0
-            for bit in nibble:
-                val = (val << 1) | bit
-            hex_str += format(val, 'x')
-        return hex_str.upper()
+        return self.des_key.hex().upper()
     
     def set_des_key_from_hex(self, hex_key):
         """
@@ -233,12 +303,14 @@ class HybridCryptosystem:
         if len(hex_key) != 16:
             raise ValueError("Hex key must be exactly 16 characters (64 bits)")
         
-        bits = []
-        for char in hex_key:
-            val = int(char, 16)
-            bits.extend([(val >> i) & 1 for i in range(3, -1, -1)])
+        # bytes.fromhex skips whitespace, so it would decode to fewer than 8 bytes
+        if any(char.isspace() for char in hex_key):
+            raise ValueError("Hex key must not contain whitespace")
         
-        self.des_key = bits
+        key = bytes.fromhex(hex_key)
+        
+        self.des_key = key
+        self._key_schedule = self.des.key_schedule(self.des_key)
 
 
 def main():
@@ -256,91 +328,87 @@ def main():
     # Test messages
     test_messages = ['HOW ARE YOU', 'HAPPY NEW YEAR', 'WELCOME TO PUERTO RICO']
     
-    # Store performance data for all tests
+    # Warm up once, so the one-time loading of the compiled DES and rotor kernels is not measured
+    crypto.decrypt(crypto.encrypt(test_messages[0]))
+    
+    # Encrypt and decrypt all the messages as one batch, under a single measurement
+    trace = {}
+    analyzer.start_monitoring()
+    ciphertexts = crypto.encrypt_batch(test_messages, trace)
+    decrypted = crypto.decrypt_batch(ciphertexts, trace)
+    analyzer.stop_monitoring()
+    
+    total_time = analyzer.get_computation_time()
+    total_cpu = analyzer.get_average_cpu_usage()
+    total_memory = analyzer.get_average_memory_usage()
+    
+    # Then each message on its own, for the per message metrics (perf_counter_ns
+    # fences around each stage, CPU and memory from the analyzer)
     all_performance_data = []
+    for message in test_messages:
+        message_trace = {}
+        analyzer.start_monitoring()
+        crypto.decrypt(crypto.encrypt(message, message_trace), message_trace)
+        analyzer.stop_monitoring()
+        all_performance_data.append({
+            'computation_time': analyzer.get_computation_time(),
+            'cpu_usage': analyzer.get_average_cpu_usage(),
+            'memory_usage': analyzer.get_average_memory_usage(),
+            'stage_ns': [message_trace[stage] for stage in ('E1_ns', 'E2_ns', 'D1_ns', 'D2_ns')]
+        })
     
-    for i, message in enumerate(test_messages, 1):
-        print(f"Plaintext {i}: '{message}'")
+    for i, message in enumerate(test_messages):
+        print(f"Plaintext {i + 1}: '{message}'")
         print()
         
-        # Start performance monitoring
-        analyzer.start_monitoring()
-        
-        # Rotor Machine Encryption (E1)
-        crypto.reset_rotors()
-        rotor_encrypted = crypto.rotor_machine.encrypt(message)
-
         print("Encryption:")
-        print(f"E1 (Rotor): {rotor_encrypted}")
-        
-        # DES Encryption (E2)
-        des_encrypted_bits = crypto.des.encrypt(rotor_encrypted, crypto.des_key)
-        des_encrypted_string = crypto.des.bits_to_string(des_encrypted_bits)
+        print(f"E1 (Rotor): {trace['E1'][i]}")
+        des_encrypted_string = crypto.des.bits_to_string(trace['E2'][i])
         print(f"E2 (DES):   {des_encrypted_string.encode('unicode_escape').decode('ascii')}")
         
         print()
         print("Decryption:")
-        
-        # DES Decryption (D1)
-        des_decrypted = crypto.des.decrypt(des_encrypted_bits, crypto.des_key)
-        print(f"D1 (DES):   {des_decrypted}")
-        
-        # Rotor Machine Decryption (D2)
-        crypto.reset_rotors()
-        final_decrypted = crypto.rotor_machine.encrypt(des_decrypted)  # Rotor is symmetric
-        print(f"D2 (Rotor): {final_decrypted}")
-        
-        # Stop performance monitoring
-        analyzer.stop_monitoring()
+        print(f"D1 (DES):   {trace['D1'][i]}")
+        print(f"D2 (Rotor): {trace['D2'][i]}")
         
         # Verification
-        print(f"Plaintext = Decryption?: {'Yes' if message.upper() == final_decrypted.upper() else 'No'}")
+        print(f"Plaintext = Decryption?: {'Yes' if message.upper() == decrypted[i].upper() else 'No'}")
         print()
-        
-        # Collect performance data
-        computation_time = analyzer.get_computation_time()
-        cpu_usage = analyzer.get_average_cpu_usage()
-        memory_usage = analyzer.get_average_memory_usage()
-        complexity_analysis = analyzer.analyze_complexity(len(message))
-        
-        performance_data = {
-            'test_num': i,
-            'message': message,
-            'computation_time': computation_time,
-            'cpu_usage': cpu_usage,
-            'memory_usage': memory_usage,
-            'complexity': complexity_analysis
-        }
-        all_performance_data.append(performance_data)
     
     # Display computational performance analysis
     print("PERFORMANCE ANALYSIS")
     print()
     
-    for data in all_performance_data:
-        print(f"Test {data['test_num']}: '{data['message']}'")
-        print(f"  Computational Complexity (Big O): {data['complexity']['hybrid']}")
+    for i, (message, data) in enumerate(zip(test_messages, all_performance_data), 1):
+        complexity = analyzer.analyze_complexity(len(message))
+        e1, e2, d1, d2 = (ns / 1e6 for ns in data['stage_ns'])
+        print(f"Test {i}: '{message}'")
+        print(f"  Computational Complexity (Big O): {complexity['hybrid']}")
         print(f"  Computation Time: {data['computation_time']:.2f} ms")
+        print(f"  Stage Times: E1 {e1:.3f} ms, E2 {e2:.3f} ms, D1 {d1:.3f} ms, D2 {d2:.3f} ms")
         print(f"  CPU Usage: {data['cpu_usage']:.1f}%")
         print(f"  Memory Usage: {data['memory_usage']:.1f}%")
-        print(f"  Message Length: {data['complexity']['message_length']} characters")
-        print(f"  DES Blocks Processed: {data['complexity']['des_blocks']} blocks")
+        print(f"  Message Length: {complexity['message_length']} characters")
+        print(f"  DES Blocks Processed: {complexity['des_blocks']} blocks")
         print()
     
-    # Overall statistics
-    total_time = sum(data['computation_time'] for data in all_performance_data)
-    avg_cpu = sum(data['cpu_usage'] for data in all_performance_data) / len(all_performance_data)
-    avg_memory = sum(data['memory_usage'] for data in all_performance_data) / len(all_performance_data)
-    total_chars = sum(data['complexity']['message_length'] for data in all_performance_data)
+    print("STAGE TIMES (all messages in one batch):")
+    print(f"  E1 (Rotor): {trace['E1_ns'] / 1e6:.3f} ms")
+    print(f"  E2 (DES):   {trace['E2_ns'] / 1e6:.3f} ms")
+    print(f"  D1 (DES):   {trace['D1_ns'] / 1e6:.3f} ms")
+    print(f"  D2 (Rotor): {trace['D2_ns'] / 1e6:.3f} ms")
+    print()
+    
+    # Overall statistics (of the batch)
+    total_chars = sum(len(message) for message in test_messages)
     
     print("OVERALL STATISTICS:")
     print(f"  Total Computation Time: {total_time:.2f} ms")
-    print(f"  Average CPU Utilization: {avg_cpu:.1f}%")
-    print(f"  Average Memory Utilization: {avg_memory:.1f}%")
+    print(f"  Average CPU Utilization: {total_cpu:.1f}%")
+    print(f"  Average Memory Utilization: {total_memory:.1f}%")
     print(f"  Total Characters Processed: {total_chars}")
     print(f"  Average Time per Character: {total_time/total_chars:.3f} ms/char")
     print()
 
-
 if __name__ == "__main__":
     main()
@@ -1,61 +1,157 @@
+import os
+import sys
 import time
+import functools
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from array import array
+import numpy as np
 import psutil
 import threading
 
+try:
+    from _kernels import rotor_encrypt
+except ImportError:  # numba is not installed, the numpy and pure Python paths are used
+    rotor_encrypt = None
+
 
 class PerformanceAnalyzer:
     """
     Analyzes performance metrics for the rotor machine.
     """
     
+    # Up to this message length, encrypting takes far less than the 50 ms between
+    # memory samples, so main() monitors without the sampling thread
+    LIGHT_MAX_CHARS = 10000
+    
     def __init__(self):
         self.start_time = 0
         self.end_time = 0
-        self.cpu_percent_samples = []
-        self.memory_percent_samples = []
+        self.start_cpu_time = 0
+        self.end_cpu_time = 0
+        # Memory samples go in a preallocated buffer, doubled when full
+        self._memory_samples = np.empty(1024, dtype=np.float32)
+        self._n_samples = 0
         self.monitoring = False
+        self.monitor_thread = None
+        self._proc = psutil.Process()
+        self._total_memory = psutil.virtual_memory().total
         
-    def start_monitoring(self):
-        """Start performance monitoring."""
-        self.start_time = time.perf_counter()
-        self.cpu_percent_samples = []
-        self.memory_percent_samples = []
+    def start_monitoring(self, light=False):
+        """
+        Start performance monitoring.
+
+        Args:
+            light: If True, do not start the memory sampling thread. Starting it
+                   costs more than encrypting a short message, and such a run ends
+                   before its first sample anyway (the memory at start and stop is
+                   still recorded).
+        """
+        self._n_samples = 0
+        self._sample_memory()
         self.monitoring = True
         
-        # Start resource monitoring in background
-        def monitor_resources():
-            while self.monitoring:
-                self.cpu_percent_samples.append(psutil.cpu_percent(interval=0.01))
-                self.memory_percent_samples.append(psutil.virtual_memory().percent)
-                time.sleep(0.01)
+        # Sample the memory in background every 50 ms, for runs long enough to
+        # change it (the CPU usage comes from the CPU times at start and stop)
+        if not light:
+            def monitor_resources():
+                while self.monitoring:
+                    time.sleep(0.05)
+                    self._sample_memory()
+            
+            self.monitor_thread = threading.Thread(target=monitor_resources, daemon=True)
+            self.monitor_thread.start()
         
-        self.monitor_thread = threading.Thread(target=monitor_resources, daemon=True)
-        self.monitor_thread.start()
+        # Wall time read outside the CPU time, so the CPU window lies inside the wall window
+        self.start_time = time.perf_counter()
+        self.start_cpu_time = time.process_time()
     
     def stop_monitoring(self):
         """Stop performance monitoring."""
+        self.end_cpu_time = time.process_time()
         self.end_time = time.perf_counter()
         self.monitoring = False
-        if hasattr(self, 'monitor_thread'):
+        if self.monitor_thread is not None:
             self.monitor_thread.join(timeout=0.1)
+            self.monitor_thread = None
+        self._sample_memory()
+    
+    @contextlib.contextmanager
+    def measure(self, light=False):
+        """
+        Monitor the code run in a with block, stopping even if it raises.
+
+        Args:
+            light: Passed to start_monitoring
+        """
+        self.start_monitoring(light)
+        try:
+            yield self
+        finally:
+            self.stop_monitoring()
+    
+    def _sample_memory(self):
+        """Record the memory used by this process as a percentage of the total memory."""
+        if self._n_samples == len(self._memory_samples):
+            self._memory_samples = np.resize(self._memory_samples, 2 * self._n_samples)
+        self._memory_samples[self._n_samples] = self._proc.memory_info().rss / self._total_memory * 100
+        self._n_samples += 1
+    
+    @property
+    def memory_percent_samples(self):
+        """Memory usage samples of the last monitoring, as a numpy array."""
+        return self._memory_samples[:self._n_samples]
     
     def get_computation_time(self):
         """Get computation time in milliseconds."""
         return (self.end_time - self.start_time) * 1000
     
     def get_average_cpu_usage(self):
-        """Get average CPU usage percentage."""
-        return sum(self.cpu_percent_samples) / len(self.cpu_percent_samples) if self.cpu_percent_samples else 0
+        """Get average CPU usage percentage (CPU time over wall time)."""
+        wall_time = self.end_time - self.start_time
+        return (self.end_cpu_time - self.start_cpu_time) / wall_time * 100 if wall_time > 0 else 0
     
     def get_average_memory_usage(self):
         """Get average memory usage percentage."""
-        return sum(self.memory_percent_samples) / len(self.memory_percent_samples) if self.memory_percent_samples else 0
+        return float(self.memory_percent_samples.mean()) if self._n_samples else 0
+
+
+@functools.lru_cache(maxsize=None)
+def _build_rotor_luts(wiring):
+    """
+    Build the integer lookup tables of a wiring. Cached, so rotors sharing
+    a wiring (like the default ones) reuse the same tables.
+
+    Args:
+        wiring: Uppercase string of 26 characters representing the substitution mapping
+
+    Returns:
+        Tuple of (forward, reverse, forward by position, reverse by position)
+        tables as bytes of letter indexes (0-25). In the tables by position,
+        entry [p * 26 + i] is the letter that comes out when i goes in with
+        the rotor at position p.
+    """
+    fwd = np.frombuffer(wiring.encode('ascii'), dtype=np.uint8).astype(np.intp) - 65
+    bwd = np.argsort(fwd)
+
+    # All positions at once: rows are the positions p, columns the letters i
+    p = np.arange(26)[:, None]
+    i = np.arange(26)[None, :]
+    fwd_at = (fwd[(i + p) % 26] - p) % 26
+    bwd_at = (bwd[(i + p) % 26] - p) % 26
+    return tuple(table.astype(np.uint8).tobytes() for table in (fwd, bwd, fwd_at, bwd_at))
+
+
 class Rotor:
     """
     Represents a single rotor in a rotor machine.
     Each rotor has a wiring configuration and can rotate.
     """
 
+    # Fixed attributes: no per instance dict, faster attribute access
+    __slots__ = ('wiring', 'notch_position', 'position', 'fwd', 'bwd', 'fwd_at', 'bwd_at')
+
     def __init__(self, wiring, notch_position=0, initial_position=0):
         """
         Initialize a rotor.
@@ -67,64 +163,43 @@ class Rotor:
         """
         self.wiring = wiring.upper()
         self.notch_position = notch_position
-        self.position = initial_position
-        # Create reverse wiring for decryption
-        self.reverse_wiring = [''] * 26
-        for i, char in enumerate(self.wiring):
-            self.reverse_wiring[ord(char) - ord('A')] = chr(ord('A') + i)
-        self.reverse_wiring = ''.join(self.reverse_wiring)
+        self.position = initial_position % 26
+        # Integer lookup tables (0-25) of the wiring and of the reverse wiring for decryption,
+        # plain and with the rotation offset of every position already applied
+        self.fwd, self.bwd, self.fwd_at, self.bwd_at = _build_rotor_luts(self.wiring)
 
     def rotate(self):
         """
         Rotate the rotor by one position.
         Returns True if the rotor completed a full rotation.
         """
-        self.position = (self.position + 1) % 26
+        # Wrap around with a compare instead of a modulo
+        self.position = self.position + 1 if self.position < 25 else 0
         return self.position == self.notch_position
 
-    def encrypt_forward(self, char):
+    def encrypt_forward(self, idx):
         """
-        Encrypt a character going forward through the rotor.
+        Encrypt a letter going forward through the rotor.
 
         Args:
-            char: Character to encrypt (A-Z)
+            idx: Letter index to encrypt (0-25 for A-Z)
 
         Returns:
-            Encrypted character
+            Encrypted letter index (0-25)
         """
-        if not char.isalpha():
-            return char
-
-        char = char.upper()
-        # Convert to index (0-25)
-        index = (ord(char) - ord('A') + self.position) % 26
-        # Apply wiring
-        encrypted_char = self.wiring[index]
-        # Account for rotation offset
-        encrypted_index = (ord(encrypted_char) - ord('A') - self.position) % 26
-        return chr(ord('A') + encrypted_index)
+        return self.fwd_at[self.position * 26 + idx]
 
-    def encrypt_backward(self, char):
+    def encrypt_backward(self, idx):
         """
-        Encrypt a character going backward through the rotor (for decryption).
+        Encrypt a letter going backward through the rotor (for decryption).
 
         Args:
-            char: Character to encrypt (A-Z)
+            idx: Letter index to encrypt (0-25 for A-Z)
 
         Returns:
-            Encrypted character
+            Encrypted letter index (0-25)
         """
-        if not char.isalpha():
-            return char
-
-        char = char.upper()
-        # Convert to index (0-25)
-        index = (ord(char) - ord('A') + self.position) % 26
-        # Apply reverse wiring
-        encrypted_char = self.reverse_wiring[index]
-        # Account for rotation offset
-        encrypted_index = (ord(encrypted_char) - ord('A') - self.position) % 26
-        return chr(ord('A') + encrypted_index)
+        return self.bwd_at[self.position * 26 + idx]
 
 
 class RotorMachine:
@@ -133,6 +208,23 @@ class RotorMachine:
     Encrypts/Decrypts with rotor rotation.
     """
 
+    # Fixed attributes: no per instance dict, faster attribute access
+    __slots__ = ('rotor1', 'rotor2', 'rotor3', 'rotation_count',
+                 '_perm_cache', '_fwd_tables', '_bwd_tables')
+
+    # Below this message length the per character loop is faster than numpy
+    # (the numba kernel, when available, is used for every length)
+    VECTORIZE_MIN_CHARS = 64
+
+    # From this many messages encrypt_many runs them all through the same numpy gathers
+    BATCH_MIN_MESSAGES = 16
+
+    # Bytes that go through the rotors (after uppercasing)
+    LETTERS = b'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+    # Reflector wiring as a table of letter indexes (A <-> Z, B <-> Y, ...)
+    REFLECTOR = bytes(range(25, -1, -1))
+
     def __init__(self, rotor1_wiring, rotor2_wiring, rotor3_wiring,
                  rotor1_notch=0, rotor2_notch=0, rotor3_notch=0,
                  rotor1_pos=0, rotor2_pos=0, rotor3_pos=0):
@@ -154,7 +246,37 @@ class RotorMachine:
         self.rotor2 = Rotor(rotor2_wiring, rotor2_notch, rotor2_pos)
         self.rotor3 = Rotor(rotor3_wiring, rotor3_notch, rotor3_pos)
         self.rotation_count = 0  # Track total rotations for performance analysis
+        # Whole rotors + reflector permutation of the letters, per rotor positions
+        self._perm_cache = {}
+        # Tables by position of the 3 rotors as numpy arrays (one row per rotor), with
+        # the reflector folded into the forward table of rotor 1
+        rotors = (self.rotor1, self.rotor2, self.rotor3)
+        self._fwd_tables = np.array([np.frombuffer(r.fwd_at, dtype=np.uint8) for r in rotors])
+        self._fwd_tables[0] = np.frombuffer(self.REFLECTOR, dtype=np.uint8)[self._fwd_tables[0]]
+        self._bwd_tables = np.array([np.frombuffer(r.bwd_at, dtype=np.uint8) for r in rotors])
     
+    def _permutation(self, positions):
+        """
+        Get the permutation of the letters done by the whole machine (forward
+        through the rotors, reflector, backward through the rotors) for some
+        rotor positions. It is built once by running every letter through it.
+
+        Args:
+            positions: Tuple of the rotor 1, rotor 2 and rotor 3 positions
+
+        Returns:
+            26 byte table of letter indexes (0-25)
+        """
+        perm = self._perm_cache.get(positions)
+        if perm is None:
+            o1, o2, o3 = (p * 26 for p in positions)
+            f1, f2, f3 = self.rotor1.fwd_at, self.rotor2.fwd_at, self.rotor3.fwd_at
+            b1, b2, b3 = self.rotor1.bwd_at, self.rotor2.bwd_at, self.rotor3.bwd_at
+            r = self.REFLECTOR
+            perm = bytes(b3[o3 + b2[o2 + b1[o1 + r[f1[o1 + f2[o2 + f3[o3 + i]]]]]]] for i in range(26))
+            self._perm_cache[positions] = perm
+        return perm
+
     def rotate_rotors(self):
         """
         Rotate the rotors.
@@ -162,18 +284,75 @@ class RotorMachine:
         the previous rotor completes a full rotation.
         """
         # Rightmost rotor always rotates
-        rotor3_completed = self.rotor3.rotate()
-        self.rotation_count += 1
-        
-        # Middle rotor rotates if rightmost completed a rotation
-        if rotor3_completed:
-            rotor2_completed = self.rotor2.rotate()
-            self.rotation_count += 1
+        rotations = 1
+        if self.rotor3.rotate():
+            # Middle rotor rotates if rightmost completed a rotation
+            rotations += 1
             # Leftmost rotor rotates if middle completed a rotation
-            if rotor2_completed:
+            if self.rotor2.rotate():
                 self.rotor1.rotate()
-                self.rotation_count += 1
+                rotations += 1
+        self.rotation_count += rotations
     
+    def position_trajectory(self, n):
+        """
+        Step the rotors n times, as n calls to rotate_rotors would, and record
+        the positions after each step.
+
+        Args:
+            n: Number of steps (one per letter to encrypt)
+
+        Returns:
+            Tuple of three array('b') with the rotor 1, rotor 2 and rotor 3 positions
+        """
+        p1, p2, p3 = self.rotor1.position, self.rotor2.position, self.rotor3.position
+        notch2, notch3 = self.rotor2.notch_position, self.rotor3.notch_position
+        pos1, pos2, pos3 = array('b', bytes(n)), array('b', bytes(n)), array('b', bytes(n))
+        rotations = n
+
+        for i in range(n):
+            # Rightmost rotor always rotates, the others when the previous one completed a rotation
+            # (positions wrap around with a compare instead of a modulo)
+            p3 = p3 + 1 if p3 < 25 else 0
+            if p3 == notch3:
+                p2 = p2 + 1 if p2 < 25 else 0
+                rotations += 1
+                if p2 == notch2:
+                    p1 = p1 + 1 if p1 < 25 else 0
+                    rotations += 1
+            pos1[i] = p1
+            pos2[i] = p2
+            pos3[i] = p3
+
+        self.rotor1.position, self.rotor2.position, self.rotor3.position = p1, p2, p3
+        self.rotation_count += rotations
+        return pos1, pos2, pos3
+
+    def _rotation_schedule(self, n):
+        """
+        Compute the positions after each of n steps from the current ones, in
+        closed form with numpy, without stepping the rotors. Rotor 2 steps the
+        first time rotor 3 reaches its notch and then every 26 steps, and rotor 1
+        the same way with the steps of rotor 2.
+
+        Args:
+            n: Number of steps (one per letter to encrypt)
+
+        Returns:
+            Tuple of int8 numpy arrays with the rotor 1, rotor 2 and rotor 3
+            positions and an array with the total rotations after each step
+        """
+        p1, p2, p3 = self.rotor1.position, self.rotor2.position, self.rotor3.position
+        notch2, notch3 = self.rotor2.notch_position, self.rotor3.notch_position
+        steps3 = np.arange(1, n + 1)
+        steps2 = ((steps3 - ((notch3 - p3 - 1) % 26 + 1)) // 26 + 1 if 0 <= notch3 < 26
+                  else np.zeros(n, dtype=np.intp))
+        steps1 = ((steps2 - ((notch2 - p2 - 1) % 26 + 1)) // 26 + 1 if 0 <= notch2 < 26
+                  else np.zeros(n, dtype=np.intp))
+        pos1, pos2, pos3 = (((p + steps) % 26).astype(np.int8)
+                            for p, steps in ((p1, steps1), (p2, steps2), (p3, steps3)))
+        return pos1, pos2, pos3, steps3 + steps2 + steps1
+
     def encrypt_char(self, char):
         """
         Encrypt a single character through all rotors.
@@ -184,28 +363,18 @@ class RotorMachine:
         Returns:
             Encrypted character
         """
-        if not char.isalpha():
+        # Uppercase once, then only the letters A-Z go through the rotors (like in encrypt)
+        char = char.upper()
+        if not ('A' <= char <= 'Z' and len(char) == 1):
             return char
 
         # Rotate rotors before encryption
         self.rotate_rotors()
 
-        char = char.upper()
-
-        # Forward through rotors
-        result = self.rotor3.encrypt_forward(char)
-        result = self.rotor2.encrypt_forward(result)
-        result = self.rotor1.encrypt_forward(result)
-
-        # Reflector
-        result = chr(ord('Z') - (ord(result) - ord('A')))
-
-        # Backward through rotors
-        result = self.rotor1.encrypt_backward(result)
-        result = self.rotor2.encrypt_backward(result)
-        result = self.rotor3.encrypt_backward(result)
-
-        return result
+        # Forward through rotors, reflector and backward through rotors in one lookup
+        positions = (self.rotor1.position, self.rotor2.position, self.rotor3.position)
+        perm = self._perm_cache.get(positions) or self._permutation(positions)
+        return chr(perm[ord(char) - 65] + 65)
 
     def encrypt(self, message):
         """
@@ -217,13 +386,143 @@ class RotorMachine:
         Returns:
             Encrypted string
         """
-        encrypted = []
-        for char in message:
-            if char.isalpha():
-                encrypted.append(self.encrypt_char(char))
-            else:
-                encrypted.append(char)
-        return ''.join(encrypted)
+        # ASCII text is encrypted as one byte buffer (uppercased there as bytes) and decoded once
+        if message.isascii():
+            return self.encrypt_bytes(message.encode('ascii')).decode('ascii')
+
+        # Uppercase once, then only the letters A-Z go through the rotors
+        message = message.upper()
+        codes = np.frombuffer(message.encode('utf-32-le'), dtype=np.uint32)
+        return self._encrypt_codes(codes).tobytes().decode('utf-32-le')
+
+    def encrypt_bytes(self, data):
+        """
+        Encrypt a message given as bytes, one state permutation lookup per letter.
+
+        Args:
+            data: Plaintext bytes to encrypt (ASCII letters go through the rotors)
+
+        Returns:
+            Encrypted bytes (letters in uppercase, other bytes unchanged)
+        """
+        # bytes.upper only maps a-z to A-Z, in one C pass
+        data = data.upper()
+
+        if rotor_encrypt is not None or len(data) >= self.VECTORIZE_MIN_CHARS:
+            return self._encrypt_codes(np.frombuffer(data, dtype=np.uint8)).tobytes()
+
+        n_letters = len(data) - len(data.translate(None, self.LETTERS))
+        # Bound methods and tables in locals; the cache is read directly and
+        # _permutation only called for the states not built yet
+        cached, permutation, letters = self._perm_cache.get, self._permutation, self.LETTERS
+        perms = iter([cached(state) or permutation(state) for state in zip(*self.position_trajectory(n_letters))])
+        return bytes(letters[next(perms)[b - 65]] if 65 <= b <= 90 else b for b in data)
+
+    def _encrypt_codes(self, codes):
+        """
+        Encrypt an uppercased message given as an array of character codes,
+        all letters at once with numpy.
+
+        Args:
+            codes: Numpy array of character codes
+
+        Returns:
+            New array of the same type with the encrypted character codes
+        """
+        if rotor_encrypt is not None:
+            rotors = (self.rotor1, self.rotor2, self.rotor3)
+            positions = np.array([r.position for r in rotors])
+            notches = np.array([r.notch_position for r in rotors])
+            encrypted, rotations = rotor_encrypt(codes, positions, notches,
+                                                 self._fwd_tables, self._bwd_tables)
+            self.rotor1.position, self.rotor2.position, self.rotor3.position = (int(p) for p in positions)
+            self.rotation_count += rotations
+            return encrypted
+
+        alpha = (codes >= 65) & (codes <= 90)
+        letters = codes[alpha].astype(np.int16) - 65
+
+        # Offsets of the rotor positions used for each letter in the tables by position
+        *positions, rotations = self._rotation_schedule(len(letters))
+        o1, o2, o3 = (p.astype(np.int16) * 26 for p in positions)
+        if len(letters):
+            self.rotor1.position, self.rotor2.position, self.rotor3.position = (int(p[-1]) for p in positions)
+            self.rotation_count += int(rotations[-1])
+
+        encrypted = codes.copy()
+        encrypted[alpha] = self._encrypt_letters(letters, o1, o2, o3) + 65
+        return encrypted
+
+    def _encrypt_letters(self, letters, o1, o2, o3):
+        """
+        Run letters through the rotors, the reflector and back with numpy gathers.
+
+        Args:
+            letters: Numpy array of letter indexes (0-25)
+            o1, o2, o3: Numpy arrays with the offset (position * 26) of rotor 1,
+                        rotor 2 and rotor 3 in the tables by position for each letter
+
+        Returns:
+            Numpy array of the encrypted letter indexes
+        """
+        fwd1, fwd2, fwd3 = self._fwd_tables
+        bwd1, bwd2, bwd3 = self._bwd_tables
+
+        # Forward through rotors and the reflector (folded into fwd1), backward through rotors
+        letters = fwd1[o1 + fwd2[o2 + fwd3[o3 + letters]]]
+        return bwd3[o3 + bwd2[o2 + bwd1[o1 + letters]]]
+
+    def encrypt_many(self, messages):
+        """
+        Encrypt several independent messages, each one from the current rotor
+        positions, with one set of numpy gathers over the letters of all of them.
+        The rotors are left at the current positions.
+
+        Args:
+            messages: List of plaintext strings to encrypt
+
+        Returns:
+            List of encrypted strings
+        """
+        rotors = (self.rotor1, self.rotor2, self.rotor3)
+        start = tuple(r.position for r in rotors)
+        messages = [message.upper() for message in messages]
+
+        # Few messages (or, with the numba kernel, long ones) are faster one by one
+        if len(messages) < self.BATCH_MIN_MESSAGES or (
+                rotor_encrypt is not None
+                and sum(map(len, messages)) >= self.VECTORIZE_MIN_CHARS * len(messages)):
+            encrypted = []
+            for message in messages:
+                for rotor, p in zip(rotors, start):
+                    rotor.position = p
+                encrypted.append(self.encrypt(message))
+            for rotor, p in zip(rotors, start):
+                rotor.position = p
+            return encrypted
+
+        codes = np.frombuffer(''.join(messages).encode('utf-32-le'), dtype=np.uint32)
+        lengths = np.array([len(message) for message in messages], dtype=np.intp)
+        alpha = (codes >= 65) & (codes <= 90)
+        letters = codes[alpha].astype(np.int16) - 65
+
+        # Index of each letter within its own message, which is its index in the rotor trajectory
+        message_of_letter = np.repeat(np.arange(len(messages)), lengths)[alpha]
+        letter_counts = np.bincount(message_of_letter, minlength=len(messages))
+        index = np.arange(len(letters)) - (np.cumsum(letter_counts) - letter_counts)[message_of_letter]
+
+        # Positions after each step, from the current ones, for the longest message,
+        # and the rotations the machine makes for each message
+        *positions, rotations = self._rotation_schedule(int(letter_counts.max(initial=0)))
+        self.rotation_count += int(rotations[letter_counts[letter_counts > 0] - 1].sum())
+
+        o1, o2, o3 = (p.astype(np.int16)[index] * 26 for p in positions)
+        encrypted = codes.copy()
+        encrypted[alpha] = self._encrypt_letters(letters, o1, o2, o3) + 65
+        text = encrypted.tobytes().decode('utf-32-le')
+
+        bounds = np.cumsum(lengths).tolist()
+        return [text[i:j] for i, j in zip([0] + bounds, bounds)]
 
     def reset(self, rotor1_pos=0, rotor2_pos=0, rotor3_pos=0):
         """
@@ -234,43 +533,60 @@ class RotorMachine:
             rotor2_pos: Position for rotor 2
             rotor3_pos: Position for rotor 3
         """
-        self.rotor1.position = rotor1_pos
-        self.rotor2.position = rotor2_pos
-        self.rotor3.position = rotor3_pos
+        self.rotor1.position = rotor1_pos % 26
+        self.rotor2.position = rotor2_pos % 26
+        self.rotor3.position = rotor3_pos % 26
         self.rotation_count = 0  # Reset rotation counter
 
 
-def main():
+# From this many test messages main() encrypts them in worker processes. With fewer,
+# starting the workers (each loading the compiled rotor kernel) costs more than the
+# messages themselves, so they are encrypted one after the other.
+PARALLEL_MIN_MESSAGES = 64
+
+
+@functools.lru_cache(maxsize=None)
+def _machine_for(machine_config):
     """
-    Test the rotor machine with performance analysis.
+    Get the rotor machine of a configuration, created once per process.
+
+    Args:
+        machine_config: Tuple of RotorMachine arguments
+
+    Returns:
+        RotorMachine instance
     """
-    # Define wiring configurations for the 3 rotors
-    rotor1_wiring = "EKMFLGDQVZNTOWYHXUSPAIBRCJ"
-    rotor2_wiring = "AJDKSIRUXBLHWTMCQGZNPYFVOE"
-    rotor3_wiring = "BDFHJLCPRTXVZNYEIWGAKMUSQO"
+    return RotorMachine(*machine_config)
 
-    # Create rotor machine
-    machine = RotorMachine(
-        rotor1_wiring, rotor2_wiring, rotor3_wiring,
-        rotor1_notch=16, rotor2_notch=4, rotor3_notch=21
-    )
-    
-    # Create performance analyzer
+
+def _warm_up(machine_config):
+    """
+    Load the compiled rotor kernel in this process, so its one-time loading is
+    not measured. Used as the initializer of the worker processes.
+
+    Args:
+        machine_config: Tuple of RotorMachine arguments
+    """
+    _machine_for(machine_config).encrypt("A")
+
+
+def encrypt_one(machine_config, message):
+    """
+    Encrypt and decrypt one test message with performance analysis. Top level
+    function so worker processes can run it.
+
+    Args:
+        machine_config: Tuple of RotorMachine arguments
+        message: Plaintext string to encrypt
+
+    Returns:
+        Dict with the encrypted and decrypted messages and the performance data
+    """
+    machine = _machine_for(machine_config)
     analyzer = PerformanceAnalyzer()
     
-    # Test messages
-    test_messages = ['HELLO', 'HOPE', 'NEW YEAR']
-    
-    # Store performance data for all tests
-    all_performance_data = []
-    
-    for i, message in enumerate(test_messages, 1):
-        print(f"Test {i}: '{message}'")
-        print()
-        
-        # Start performance monitoring
-        analyzer.start_monitoring()
-        
+    # Monitor performance (without the sampling thread for short messages)
+    with analyzer.measure(light=len(message) <= analyzer.LIGHT_MAX_CHARS):
         # Reset machine to initial rotor positions
         machine.reset(0, 0, 0)
 
@@ -284,42 +600,84 @@ def main():
         # Decrypt (can use encrypt again for the same result)
         decrypted = machine.encrypt(encrypted)
         total_rotations = encryption_rotations + machine.rotation_count
-        
-        # Stop performance monitoring
-        analyzer.stop_monitoring()
-        
-        print(f"Plaintext:  {message}")
-        print(f"Encrypted:  {encrypted}")
-        print(f"Decrypted:  {decrypted}")
-        print(f"Plaintext = Decryption?: {'Yes' if message.upper() == decrypted else 'No'}")
-        print()
+    
+    return {
+        'encrypted': encrypted,
+        'decrypted': decrypted,
+        'computation_time': analyzer.get_computation_time(),
+        'cpu_usage': analyzer.get_average_cpu_usage(),
+        'memory_usage': analyzer.get_average_memory_usage(),
+        'total_rotations': total_rotations
+    }
+
+
+def main():
+    """
+    Test the rotor machine with performance analysis.
+
+    The messages are encrypted in worker processes only from PARALLEL_MIN_MESSAGES
+    messages on, so the three test messages below do not use that branch.
+    """
+    # Define wiring configurations for the 3 rotors
+    rotor1_wiring = "EKMFLGDQVZNTOWYHXUSPAIBRCJ"
+    rotor2_wiring = "AJDKSIRUXBLHWTMCQGZNPYFVOE"
+    rotor3_wiring = "BDFHJLCPRTXVZNYEIWGAKMUSQO"
+
+    # Rotor machine configuration (wirings, then notches of rotor 1, 2 and 3)
+    machine_config = (rotor1_wiring, rotor2_wiring, rotor3_wiring, 16, 4, 21)
+    
+    # Test messages
+    test_messages = ['HELLO', 'HOPE', 'NEW YEAR']
+    
+    # Encrypt the messages independently, each one with the machine from its initial
+    # positions. Warm up once per process, so the one-time loading of the compiled
+    # rotor kernel is not measured.
+    if len(test_messages) >= PARALLEL_MIN_MESSAGES:
+        with ProcessPoolExecutor(max_workers=min(len(test_messages), os.cpu_count() or 1),
+                                 initializer=_warm_up, initargs=(machine_config,)) as pool:
+            results = list(pool.map(encrypt_one, repeat(machine_config), test_messages))
+    else:
+        _warm_up(machine_config)
+        results = [encrypt_one(machine_config, message) for message in test_messages]
+    
+    # Store performance data for all tests
+    all_performance_data = []
+    
+    # Report lines, written out at once at the end
+    report = []
+    
+    for i, (message, result) in enumerate(zip(test_messages, results), 1):
+        report.append(f"Test {i}: '{message}'")
+        report.append("")
+        report.append(f"Plaintext:  {message}")
+        report.append(f"Encrypted:  {result['encrypted']}")
+        report.append(f"Decrypted:  {result['decrypted']}")
+        report.append(f"Plaintext = Decryption?: {'Yes' if message.upper() == result['decrypted'] else 'No'}")
+        report.append("")
         
         # Collect performance data
-        computation_time = analyzer.get_computation_time()
-        cpu_usage = analyzer.get_average_cpu_usage()
-        memory_usage = analyzer.get_average_memory_usage()
         performance_data = {
             'test_num': i,
             'message': message,
-            'computation_time': computation_time,
-            'cpu_usage': cpu_usage,
-            'memory_usage': memory_usage,
+            'computation_time': result['computation_time'],
+            'cpu_usage': result['cpu_usage'],
+            'memory_usage': result['memory_usage'],
             'message_length': len(message),
-            'total_rotations': total_rotations
+            'total_rotations': result['total_rotations']
         }
         all_performance_data.append(performance_data)
     
     # Display comprehensive performance analysis
-    print("ROTOR MACHINE PERFORMANCE ANALYSIS:")
+    report.append("ROTOR MACHINE PERFORMANCE ANALYSIS:")
     
     for data in all_performance_data:
-        print(f"Test {data['test_num']}: '{data['message']}'")
-        print(f"  Computation Time: {data['computation_time']:.2f} ms")
-        print(f"  CPU Usage: {data['cpu_usage']:.1f}%")
-        print(f"  Memory Usage: {data['memory_usage']:.1f}%")
-        print(f"  Message Length: {data['message_length']} characters")
-        print(f"  Total Rotor Rotations: {data['total_rotations']}")
-        print()
+        report.append(f"Test {data['test_num']}: '{data['message']}'")
+        report.append(f"  Computation Time: {data['computation_time']:.2f} ms")
+        report.append(f"  CPU Usage: {data['cpu_usage']:.1f}%")
+        report.append(f"  Memory Usage: {data['memory_usage']:.1f}%")
+        report.append(f"  Message Length: {data['message_length']} characters")
+        report.append(f"  Total Rotor Rotations: {data['total_rotations']}")
+        report.append("")
     
     # Overall statistics
     total_time = sum(data['computation_time'] for data in all_performance_data)
@@ -328,14 +686,16 @@ def main():
     total_chars = sum(data['message_length'] for data in all_performance_data)
     total_rotations = sum(data['total_rotations'] for data in all_performance_data)
     
-    print("OVERALL STATISTICS:")
-    print(f"  Total Computation Time: {total_time:.2f} ms")
-    print(f"  Average CPU Utilization: {avg_cpu:.1f}%")
-    print(f"  Average Memory Utilization: {avg_memory:.1f}%")
-    print(f"  Total Characters Processed: {total_chars}")
-    print(f"  Total Rotor Rotations: {total_rotations}")
-    print(f"  Average Time per Character: {total_time/total_chars:.3f} ms/char")
-    print()
+    report.append("OVERALL STATISTICS:")
+    report.append(f"  Total Computation Time: {total_time:.2f} ms")
+    report.append(f"  Average CPU Utilization: {avg_cpu:.1f}%")
+    report.append(f"  Average Memory Utilization: {avg_memory:.1f}%")
+    report.append(f"  Total Characters Processed: {total_chars}")
+    report.append(f"  Total Rotor Rotations: {total_rotations}")
+    report.append(f"  Average Time per Character: {total_time/total_chars:.3f} ms/char")
+    report.append("")
+    
+    sys.stdout.write('\n'.join(report) + '\n')
 
 
 if __name__ == "__main__":
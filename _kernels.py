@@ -0,0 +1,80 @@
+import numpy as np
+from numba import njit, prange
+
+# Numba compiled kernels. The lookup tables are passed in as numpy arrays built by the
+# classes that own them, so this module does not depend on Des.py or Rotor.py.
+
+
+# Applies a permutation given as byte translation tables (one row of 256 entries per
+# input byte, most significant first) to a uint64.
+@njit(cache=True)
+def permute_u64(x, xlat):
+    out = np.uint64(0)
+    nbytes = xlat.shape[0]
+    for b in range(nbytes):
+        out |= xlat[b, (x >> np.uint64(8 * (nbytes - 1 - b))) & np.uint64(0xFF)]
+    return out
+
+
+# One DES block: IP, 16 rounds using the SP-boxes and IP_INV. subkeys are already in the
+# order of the rounds (reversed for decryption).
+@njit(cache=True)
+def des_block_u64(block, subkeys, sp, ip, ip_inv, e):
+    block = permute_u64(block, ip)
+    L = block >> np.uint64(32)
+    R = block & np.uint64(0xFFFFFFFF)
+    mask6 = np.uint64(0x3F)
+
+    for k in range(subkeys.shape[0]):
+        x = permute_u64(R, e) ^ subkeys[k]
+        f = (sp[0, x >> np.uint64(42)] ^ sp[1, (x >> np.uint64(36)) & mask6] ^
+             sp[2, (x >> np.uint64(30)) & mask6] ^ sp[3, (x >> np.uint64(24)) & mask6] ^
+             sp[4, (x >> np.uint64(18)) & mask6] ^ sp[5, (x >> np.uint64(12)) & mask6] ^
+             sp[6, (x >> np.uint64(6)) & mask6] ^ sp[7, x & mask6])
+        L, R = R, L ^ np.uint64(f)
+
+    return permute_u64((R << np.uint64(32)) | L, ip_inv)
+
+
+# Runs des_block_u64 on every block (ECB style), spread over the CPU cores.
+@njit(parallel=True, cache=True)
+def des_ecb_u64(blocks, subkeys, sp, ip, ip_inv, e):
+    out = np.empty_like(blocks)
+    for i in prange(blocks.shape[0]):
+        out[i] = des_block_u64(blocks[i], subkeys, sp, ip, ip_inv, e)
+    return out
+
+
+# Rotor machine encryption of a message given as an array of uppercase character codes.
+# Steps the rotors before each letter A-Z like RotorMachine.rotate_rotors, runs it through
+# the rotors (tables by position, rows rotor 1 to 3, the reflector folded into the forward
+# table of rotor 1) and back, and leaves the other characters unchanged. positions is
+# updated in place and the number of rotor rotations is returned with the encrypted codes.
+@njit(cache=True)
+def rotor_encrypt(codes, positions, notches, fwd_at, bwd_at):
+    out = codes.copy()
+    p1, p2, p3 = positions[0], positions[1], positions[2]
+    notch2, notch3 = notches[1], notches[2]
+    rotations = 0
+
+    for i in range(codes.shape[0]):
+        c = codes[i]
+        if c < 65 or c > 90:
+            continue
+
+        p3 = p3 + 1 if p3 < 25 else 0
+        rotations += 1
+        if p3 == notch3:
+            p2 = p2 + 1 if p2 < 25 else 0
+            rotations += 1
+            if p2 == notch2:
+                p1 = p1 + 1 if p1 < 25 else 0
+                rotations += 1
+
+        o1, o2, o3 = p1 * 26, p2 * 26, p3 * 26
+        x = fwd_at[0, o1 + fwd_at[1, o2 + fwd_at[2, o3 + c - 65]]]
+        x = bwd_at[2, o3 + bwd_at[1, o2 + bwd_at[0, o1 + x]]]
+        out[i] = x + 65
+
+    positions[0], positions[1], positions[2] = p1, p2, p3
+    return out, rotations